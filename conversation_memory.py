@@ -3,12 +3,148 @@ Persistent Conversation Memory System
 Stores and retrieves conversation history across sessions
 """
 
-import json
+import mmap
 import os
+import struct
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
 from datetime import datetime
 from typing import List, Dict, Optional
 from pathlib import Path
 
+try:
+    import orjson
+
+    def _dumps(data) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+    def _dumps_pretty(data) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+
+    def _dumps_line(data) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS) + b'\n'
+
+    _encode_value = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    import json
+
+    def _dumps(data) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=asdict).encode('utf-8')
+
+    def _dumps_pretty(data) -> bytes:
+        return json.dumps(data, indent=2, ensure_ascii=False, default=asdict).encode('utf-8')
+
+    def _dumps_line(data) -> bytes:
+        return json.dumps(data, ensure_ascii=False, default=asdict).encode('utf-8') + b'\n'
+
+    _compact_encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+    def _encode_value(value) -> bytes:
+        return _compact_encode(value).encode('utf-8')
+
+    def _loads(data):
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+@dataclass(slots=True)
+class Message:
+    """A single message in the current conversation"""
+    role: str
+    content: str
+    timestamp: str
+    metadata: Dict = field(default_factory=dict)
+
+def _build_message_encoder():
+    """Generate a Message -> JSON bytes function with the field names baked in"""
+    members = " + b',' + ".join(
+        f"b'\"{f.name}\":' + _encode_value(message.{f.name})" for f in fields(Message)
+    )
+    source = f"def _encode_message(message):\n    return b'{{' + {members} + b'}}'\n"
+    namespace = {'_encode_value': _encode_value}
+    exec(compile(source, '<message encoder>', 'exec'), namespace)
+    return namespace['_encode_message']
+
+# Skips per-message key discovery, which matters most for the stdlib fallback
+_encode_message = _build_message_encoder()
+
+def _dumps_conversation_line(record: Dict) -> bytes:
+    """Serialize a conversation record whose 'messages' are Message objects"""
+    head = _dumps_line({key: value for key, value in record.items() if key != 'messages'})
+    messages = b','.join(map(_encode_message, record['messages']))
+    return head[:-2] + b',"messages":[' + messages + b']}\n'
+
+# Pending messages are appended to the conversation's .jsonl file once either
+# limit is reached, so a crash loses at most one small batch.
+FLUSH_EVERY_MESSAGES = 16
+FLUSH_EVERY_SECONDS = 5.0
+
+# Saved conversations, one JSON record per line, and the 8-byte byte offset
+# of each record so recent ones can be read without scanning the file
+HISTORY_FILE = "history.jsonl"
+HISTORY_INDEX_FILE = "history.idx"
+
+# Block size used when reading a message log backwards from the end
+TAIL_CHUNK_BYTES = 4096
+
+# Histories with fewer conversations than this are loaded without a thread pool
+PARALLEL_LOAD_MIN_FILES = 4
+MAX_LOAD_WORKERS = 8
+
+# Below this size a plain read() is cheaper than setting up a memory map
+MMAP_MIN_BYTES = 16 * 1024
+
+def _write_json_file(path: Path, data):
+    """Serialize data in one write to a temp file, then swap it into place"""
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(_dumps(data))
+    os.replace(tmp_path, path)
+
+def _read_json_file(path: Path):
+    """Parse a JSON file, memory-mapping it when it is large"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_BYTES:
+            return _loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return _loads(view)
+
+def dump_pretty(path) -> str:
+    """Return a stored JSON file re-indented for reading (files are kept compact)"""
+    return _dumps_pretty(_read_json_file(Path(path))).decode('utf-8')
+
+def _read_jsonl_file(path: Path) -> List[Dict]:
+    """Parse a JSON Lines file, memory-mapping it when it is large"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_BYTES:
+            return [_loads(line) for line in f if line.strip()]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return [_loads(line) for line in iter(mm.readline, b'') if line.strip()]
+
+def _tail_jsonl(path: Path, n: int) -> List[Dict]:
+    """Parse only the last n records of a JSON Lines file"""
+    if n <= 0:
+        return []
+    
+    with open(path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        buf = b''
+        # n complete lines need n + 1 newlines in front of the final one
+        while pos > 0 and buf.count(b'\n') <= n:
+            step = min(TAIL_CHUNK_BYTES, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+    
+    lines = buf.split(b'\n')
+    if pos > 0:
+        lines = lines[1:]  # first line is cut off at the chunk boundary
+    lines = [line for line in lines if line.strip()]
+    return [_loads(line) for line in lines[-n:]]
+
 class ConversationMemory:
     """Manages persistent conversation history for patients."""
     
@@ -17,93 +153,375 @@ class ConversationMemory:
         self.storage_dir.mkdir(exist_ok=True)
         self.current_conversation = []
         self.patient_id = None
+        self.conversation_id = None
+        self._pending = []
+        self._log_file = None
+        self._last_flush = time.monotonic()
+        # (message_count, red flag Counter) already recorded in summary.json
+        # for the current conversation
+        self._summarized = (0, Counter())
+        # patient_id -> (patient_dir mtime, parsed conversations)
+        self._history_cache: Dict[str, tuple] = {}
     
     def start_conversation(self, patient_id: str) -> Dict:
         """Start a new conversation for a patient"""
+        self._close_log()
         self.patient_id = patient_id
+        # Microseconds keep conversations started in the same second, e.g. by
+        # concurrent test runs, in separate files; ids still sort by time
+        self.conversation_id = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
         self.current_conversation = []
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._summarized = (0, Counter())
         
         history = self.get_patient_history(patient_id)
         
         return {
             'patient_id': patient_id,
-            'conversation_id': datetime.now().strftime('%Y%m%d_%H%M%S'),
+            'conversation_id': self.conversation_id,
             'started_at': datetime.now().isoformat(),
             'previous_conversations': len(history)
         }
     
     def add_message(self, role: str, content: str, metadata: Optional[Dict] = None):
         """Add a message to the current conversation"""
-        message = {
-            'role': role,
-            'content': content,
-            'timestamp': datetime.now().isoformat(),
-            'metadata': metadata or {}
-        }
+        message = Message(role, content, datetime.now().isoformat(), metadata or {})
         self.current_conversation.append(message)
+        self._pending.append(message)
+        
+        if (len(self._pending) >= FLUSH_EVERY_MESSAGES or
+                time.monotonic() - self._last_flush >= FLUSH_EVERY_SECONDS):
+            self._flush()
+    
+    def _flush(self):
+        """Append pending messages to the conversation's JSON Lines file"""
+        self._last_flush = time.monotonic()
+        if not self._pending or not self.patient_id:
+            return
+        
+        if self._log_file is None:
+            patient_dir = self.storage_dir / self.patient_id
+            patient_dir.mkdir(exist_ok=True)
+            self._log_file = open(patient_dir / f"conversation_{self.conversation_id}.jsonl", 'ab')
+        
+        self._log_file.write(b''.join(_encode_message(m) + b'\n' for m in self._pending))
+        self._log_file.flush()
+        os.fsync(self._log_file.fileno())
+        
+        # Only drop the batch once it is on disk
+        self._pending = []
+        self._history_cache.pop(self.patient_id, None)
+    
+    def _close_log(self):
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
     
     def save_conversation(self):
-        """Save current conversation to disk"""
+        """Append the current conversation to the patient's history file"""
         if not self.patient_id:
             raise ValueError("No active conversation")
         
         if not self.current_conversation:
             return
         
-        patient_dir = self.storage_dir / self.patient_id
-        patient_dir.mkdir(exist_ok=True)
+        self._flush()
+        self._close_log()
         
-        conversation_id = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = patient_dir / f"conversation_{conversation_id}.json"
+        patient_dir = self.storage_dir / self.patient_id
         
         data = {
             'patient_id': self.patient_id,
-            'conversation_id': conversation_id,
-            'started_at': self.current_conversation[0]['timestamp'],
+            'conversation_id': self.conversation_id,
+            'started_at': self.current_conversation[0].timestamp,
             'ended_at': datetime.now().isoformat(),
             'message_count': len(self.current_conversation),
+            'red_flags': [
+                flag
+                for message in self.current_conversation
+                for flag in message.metadata.get('red_flags') or []
+            ],
             'messages': self.current_conversation
         }
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        history_file = self._append_history(patient_dir, data)
+        
+        # The session log is redundant once the full record is in history.jsonl
+        log_file = patient_dir / f"conversation_{self.conversation_id}.jsonl"
+        log_file.unlink(missing_ok=True)
+        
+        self._history_cache.pop(self.patient_id, None)
+        self._update_summary(self.patient_id, data)
+        print(f"✓ Conversation {self.conversation_id} saved to {history_file}")
+    
+    def _append_history(self, patient_dir: Path, record: Dict) -> Path:
+        """Append one conversation record to history.jsonl and its offset to history.idx"""
+        history_file = patient_dir / HISTORY_FILE
+        
+        if history_file.exists():
+            # Repairs a stale index before another offset is added to it
+            self._history_offsets(patient_dir)
+        
+        with open(history_file, 'ab') as f:
+            offset = f.tell()
+            f.write(_dumps_conversation_line(record))
+            f.flush()
+            os.fsync(f.fileno())
         
-        print(f"✓ Conversation saved: {filename}")
+        with open(patient_dir / HISTORY_INDEX_FILE, 'ab') as f:
+            f.write(struct.pack('<Q', offset))
+        
+        return history_file
+    
+    def _history_offsets(self, patient_dir: Path) -> List[int]:
+        """Get the byte offset of each history.jsonl record, rebuilding history.idx if stale"""
+        history_file = patient_dir / HISTORY_FILE
+        index_file = patient_dir / HISTORY_INDEX_FILE
+        size = history_file.stat().st_size
+        
+        offsets = []
+        index_ok = False
+        if index_file.exists():
+            raw = index_file.read_bytes()
+            if len(raw) % 8 == 0:
+                offsets = [offset for (offset,) in struct.iter_unpack('<Q', raw)]
+                if not offsets:
+                    index_ok = size == 0
+                elif offsets[-1] < size:
+                    # The last indexed record must end exactly at EOF
+                    with open(history_file, 'rb') as f:
+                        f.seek(offsets[-1])
+                        f.readline()
+                        index_ok = f.tell() == size
+        
+        if index_ok:
+            return offsets
+        
+        offsets = []
+        position = 0
+        with open(history_file, 'rb') as f:
+            for line in f:
+                offsets.append(position)
+                position += len(line)
+        
+        tmp_path = index_file.with_name(index_file.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(struct.pack('<Q', offset) for offset in offsets))
+        os.replace(tmp_path, index_file)
+        
+        return offsets
+    
+    def _iter_history_newest_first(self, patient_dir: Path):
+        """Yield history.jsonl records from the end, seeking via history.idx"""
+        history_file = patient_dir / HISTORY_FILE
+        if not history_file.exists():
+            return
+        
+        offsets = self._history_offsets(patient_dir)
+        with open(history_file, 'rb') as f:
+            for offset in reversed(offsets):
+                f.seek(offset)
+                yield _loads(f.readline())
+    
+    def _update_summary(self, patient_id: str, conversation: Dict):
+        """Fold the current conversation into the patient's summary.json"""
+        summary_file = self.storage_dir / patient_id / "summary.json"
+        red_flags = Counter(conversation['red_flags'])
+        
+        if not summary_file.exists():
+            # Covers older patient folders too; history already includes this save
+            summary = self._build_summary(patient_id)
+        else:
+            summary = _read_json_file(summary_file)
+            counted_messages, counted_flags = self._summarized
+            
+            if not counted_messages:
+                summary['total_conversations'] += 1
+                summary['first_conversation'] = summary['first_conversation'] or conversation['started_at']
+            summary['total_messages'] += conversation['message_count'] - counted_messages
+            summary['last_conversation'] = conversation['started_at']
+            
+            flag_counts = Counter(summary['red_flag_counts'])
+            flag_counts.update(red_flags)
+            flag_counts.subtract(counted_flags)
+            summary['red_flag_counts'] = {flag: n for flag, n in flag_counts.items() if n > 0}
+        
+        _write_json_file(summary_file, summary)
+        
+        self._summarized = (conversation['message_count'], red_flags)
+    
+    def _build_summary(self, patient_id: str) -> Dict:
+        """Compute summary.json contents from the full history"""
+        metas = self._get_patient_meta(patient_id)
+        
+        red_flags = Counter()
+        for meta in metas:
+            red_flags.update(meta['red_flags'])
+        
+        return {
+            'total_conversations': len(metas),
+            'total_messages': sum(meta['message_count'] for meta in metas),
+            'first_conversation': metas[0]['started_at'] if metas else None,
+            'last_conversation': metas[-1]['started_at'] if metas else None,
+            'red_flag_counts': dict(red_flags)
+        }
+    
+    def _get_patient_meta(self, patient_id: str) -> List[Dict]:
+        """Get the summary fields of each conversation"""
+        return [
+            {
+                'started_at': conversation['started_at'],
+                'message_count': conversation['message_count'],
+                'red_flags': [
+                    flag
+                    for message in conversation['messages']
+                    for flag in message.get('metadata', {}).get('red_flags') or ()
+                ]
+            }
+            for conversation in self.get_patient_history(patient_id)
+        ]
     
     def get_patient_history(self, patient_id: str) -> List[Dict]:
         """Get all conversations for a patient"""
         patient_dir = self.storage_dir / patient_id
+        history_file = patient_dir / HISTORY_FILE
         
-        if not patient_dir.exists():
+        try:
+            dir_mtime = patient_dir.stat().st_mtime_ns
+        except FileNotFoundError:
             return []
         
-        conversations = []
-        for file in sorted(patient_dir.glob("conversation_*.json")):
-            with open(file, 'r', encoding='utf-8') as f:
-                conversations.append(json.load(f))
+        # history.jsonl grows without touching the directory mtime
+        cache_key = (dir_mtime, history_file.stat().st_size if history_file.exists() else 0)
+        cached = self._history_cache.get(patient_id)
+        if cached and cached[0] == cache_key:
+            return cached[1]
+        
+        # A conversation saved more than once keeps its latest record
+        records = {}
+        if history_file.exists():
+            for record in _read_jsonl_file(history_file):
+                records[record['conversation_id']] = record
+        
+        # Older conversations and unsaved sessions live in their own files
+        file_ids = self._conversation_ids(patient_dir)
         
+        if len(file_ids) < PARALLEL_LOAD_MIN_FILES:
+            loaded = [
+                self._load_conversation(patient_dir, conversation_id, records.get(conversation_id))
+                for conversation_id in file_ids
+            ]
+        else:
+            with ThreadPoolExecutor(max_workers=min(MAX_LOAD_WORKERS, len(file_ids))) as executor:
+                loaded = list(executor.map(
+                    lambda conversation_id: self._load_conversation(
+                        patient_dir, conversation_id, records.get(conversation_id)),
+                    file_ids
+                ))
+        
+        records.update(zip(file_ids, loaded))
+        conversations = [records[conversation_id] for conversation_id in sorted(records)]
+        
+        self._history_cache[patient_id] = (cache_key, conversations)
         return conversations
     
+    def _conversation_ids(self, patient_dir: Path) -> List[str]:
+        """Get the ids of conversations stored in their own files, oldest first"""
+        with os.scandir(patient_dir) as entries:
+            return sorted({
+                entry.name[len("conversation_"):].split('.', 1)[0]
+                for entry in entries
+                if entry.name.startswith("conversation_")
+                and entry.name.endswith((".json", ".jsonl"))
+            })
+    
+    def _load_conversation(self, patient_dir: Path, conversation_id: str,
+                           record: Optional[Dict] = None) -> Dict:
+        """Load one conversation from its history record and/or its own files"""
+        meta_file = patient_dir / f"conversation_{conversation_id}.json"
+        log_file = patient_dir / f"conversation_{conversation_id}.jsonl"
+        
+        if record is not None:
+            conversation = dict(record)
+        elif meta_file.exists():
+            conversation = _read_json_file(meta_file)
+        else:
+            conversation = {}
+        
+        # Older conversations embed their messages in the .json file; a log
+        # holds messages that were never saved (or added after the last save)
+        messages = conversation.get('messages') or []
+        if log_file.exists():
+            messages = messages + _read_jsonl_file(log_file)
+        conversation['messages'] = messages
+        
+        conversation.setdefault('patient_id', patient_dir.name)
+        conversation.setdefault('conversation_id', conversation_id)
+        conversation.setdefault('started_at', messages[0]['timestamp'] if messages else None)
+        conversation.setdefault('ended_at', messages[-1]['timestamp'] if messages else None)
+        conversation['message_count'] = len(messages)
+        return conversation
+    
+    def _iter_conversations_newest_first(self, patient_dir: Path):
+        """Yield (conversation_id, history record or None) pairs, newest first"""
+        file_ids = self._conversation_ids(patient_dir)
+        records = self._iter_history_newest_first(patient_dir)
+        record = next(records, None)
+        seen = set()
+        
+        while record is not None or file_ids:
+            if record is not None and (not file_ids or record['conversation_id'] >= file_ids[-1]):
+                conversation_id, item = record['conversation_id'], record
+                record = next(records, None)
+            else:
+                conversation_id, item = file_ids.pop(), None
+            
+            if conversation_id not in seen:
+                seen.add(conversation_id)
+                yield conversation_id, item
+    
     def get_recent_context(self, patient_id: str, max_messages: int = 10) -> List[Dict]:
         """Get recent conversation context for a patient"""
-        history = self.get_patient_history(patient_id)
+        patient_dir = self.storage_dir / patient_id
         
-        if not history:
+        if not patient_dir.exists():
             return []
         
-        all_messages = []
-        for conversation in reversed(history):
-            all_messages.extend(conversation['messages'])
-            if len(all_messages) >= max_messages:
+        # Walk conversations newest first, parsing only what is needed
+        recent_messages = deque(maxlen=max(max_messages, 0))
+        for conversation_id, record in self._iter_conversations_newest_first(patient_dir):
+            needed = max_messages - len(recent_messages)
+            if needed <= 0:
                 break
+            
+            log_file = patient_dir / f"conversation_{conversation_id}.jsonl"
+            messages = _tail_jsonl(log_file, needed) if log_file.exists() else []
+            
+            if len(messages) < needed:
+                if record is None:
+                    meta_file = patient_dir / f"conversation_{conversation_id}.json"
+                    record = _read_json_file(meta_file) if meta_file.exists() else {}
+                earlier = record.get('messages') or []
+                messages = earlier[-(needed - len(messages)):] + messages
+            
+            recent_messages.extendleft(reversed(messages))
         
-        return all_messages[-max_messages:]
+        return list(recent_messages)
     
     def get_conversation_summary(self, patient_id: str) -> Dict:
         """Get summary statistics for a patient's conversations"""
-        history = self.get_patient_history(patient_id)
+        patient_dir = self.storage_dir / patient_id
+        summary_file = patient_dir / "summary.json"
+        
+        if summary_file.exists():
+            summary = _read_json_file(summary_file)
+        else:
+            summary = self._build_summary(patient_id)
+            if summary['total_conversations']:
+                _write_json_file(summary_file, summary)
         
-        if not history:
+        if not summary['total_conversations']:
             return {
                 'total_conversations': 0,
                 'total_messages': 0,
@@ -111,24 +529,26 @@ class ConversationMemory:
                 'last_conversation': None
             }
         
-        total_messages = sum(conv['message_count'] for conv in history)
-        
-        red_flags = []
-        for conversation in history:
-            for message in conversation['messages']:
-                if message.get('metadata', {}).get('red_flags'):
-                    red_flags.extend(message['metadata']['red_flags'])
+        red_flags = summary['red_flag_counts']
         
         return {
-            'total_conversations': len(history),
-            'total_messages': total_messages,
-            'first_conversation': history[0]['started_at'],
-            'last_conversation': history[-1]['started_at'],
-            'red_flags_detected': len(red_flags),
-            'unique_red_flags': list(set(red_flags))
+            'total_conversations': summary['total_conversations'],
+            'total_messages': summary['total_messages'],
+            'first_conversation': summary['first_conversation'],
+            'last_conversation': summary['last_conversation'],
+            'red_flags_detected': sum(red_flags.values()),
+            'unique_red_flags': list(red_flags)
         }
     
     def clear_current_conversation(self):
         """Clear the current conversation without saving"""
+        self._close_log()
+        if self.patient_id and self.conversation_id:
+            log_file = self.storage_dir / self.patient_id / f"conversation_{self.conversation_id}.jsonl"
+            log_file.unlink(missing_ok=True)
+            self._history_cache.pop(self.patient_id, None)
+        
         self.current_conversation = []
-        self.patient_id = None
\ No newline at end of file
+        self._pending = []
+        self.patient_id = None
+        self.conversation_id = None
\ No newline at end of file
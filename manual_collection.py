@@ -3,10 +3,47 @@ Manual Test Case Collection Tool
 Quick way to add real patient questions you find online
 """
 
-import json
+import sys
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
 
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+
+    def _dumps_pretty(data) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+
+    _loads = orjson.loads
+except ImportError:
+    import json
+
+    def _dumps(data) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def _dumps_pretty(data) -> bytes:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+    _loads = json.loads
+
+# Keyword lists in priority order: the first category with a match wins
+CATEGORY_KEYWORDS = [
+    ('symptom_identification', ['is this', 'what is', 'do i have', 'symptoms']),
+    ('treatment_options', ['how to', 'treat', 'cure', 'remedy', 'help']),
+    ('when_to_see_doctor', ['should i see', 'doctor', 'emergency', 'urgent']),
+    ('prevention', ['prevent', 'avoid', 'stop']),
+    ('medication', ['medication', 'drug', 'prescription']),
+    ('lifestyle', ['diet', 'food', 'fiber', 'eat']),
+]
+
+# Flattened (phrase, category) pairs, still in priority order, so the
+# first substring hit is the answer
+_CATEGORY_TABLE = tuple(
+    (word, category) for category, words in CATEGORY_KEYWORDS for word in words
+)
+
 class ManualQuestionCollector:
     """
     Interactive tool to quickly add patient questions you find
@@ -14,9 +51,16 @@ class ManualQuestionCollector:
     
     def __init__(self):
         self.questions = []
+        self._next_id = 1
         self.output_dir = Path("test_data")
         self.output_dir.mkdir(exist_ok=True)
     
+    def _take_ids(self, count: int) -> list:
+        """Reserve the next `count` question IDs"""
+        start = self._next_id
+        self._next_id += count
+        return [f"manual_{i:03d}" for i in range(start, self._next_id)]
+    
     def add_question(self):
         """Add a single question interactively"""
         print("\n" + "="*60)
@@ -52,7 +96,7 @@ class ManualQuestionCollector:
         url = input("URL (optional, press Enter to skip): ").strip() or ""
         
         self.questions.append({
-            'id': f"manual_{len(self.questions) + 1:03d}",
+            'id': self._take_ids(1)[0],
             'title': question,
             'body': '',
             'source': source,
@@ -68,9 +112,9 @@ class ManualQuestionCollector:
         """Add multiple questions from pasted text (one per line)"""
         lines = [line.strip() for line in text_input.split('\n') if line.strip()]
         
-        for line in lines:
+        for qid, line in zip(self._take_ids(len(lines)), lines):
             self.questions.append({
-                'id': f"manual_{len(self.questions) + 1:03d}",
+                'id': qid,
                 'title': line,
                 'body': '',
                 'source': 'Manual',
@@ -85,29 +129,26 @@ class ManualQuestionCollector:
         """Automatically categorize based on keywords"""
         text_lower = text.lower()
         
-        if any(word in text_lower for word in ['is this', 'what is', 'do i have', 'symptoms']):
-            return 'symptom_identification'
-        elif any(word in text_lower for word in ['how to', 'treat', 'cure', 'remedy', 'help']):
-            return 'treatment_options'
-        elif any(word in text_lower for word in ['should i see', 'doctor', 'emergency', 'urgent']):
-            return 'when_to_see_doctor'
-        elif any(word in text_lower for word in ['prevent', 'avoid', 'stop']):
-            return 'prevention'
-        elif any(word in text_lower for word in ['medication', 'drug', 'prescription']):
-            return 'medication'
-        elif any(word in text_lower for word in ['diet', 'food', 'fiber', 'eat']):
-            return 'lifestyle'
-        else:
-            return 'general'
+        for phrase, category in _CATEGORY_TABLE:
+            if phrase in text_lower:
+                return category
+        
+        return 'general'
     
     def load_existing(self, filename: str = "manual_test_cases.json"):
         """Load previously saved questions"""
         filepath = self.output_dir / filename
         
         if filepath.exists():
-            with open(filepath, 'r') as f:
-                data = json.load(f)
+            with open(filepath, 'rb') as f:
+                data = _loads(f.read())
                 self.questions = data.get('questions', [])
+                # Continue after the highest saved number so deletions never cause reuse
+                self._next_id = max(
+                    (int(q['id'].rsplit('_', 1)[1]) for q in self.questions
+                     if q.get('id', '').rsplit('_', 1)[-1].isdigit()),
+                    default=len(self.questions)
+                ) + 1
                 print(f"✓ Loaded {len(self.questions)} existing questions")
         else:
             print("No existing questions found")
@@ -123,20 +164,31 @@ class ManualQuestionCollector:
             'questions': self.questions
         }
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        with open(filepath, 'wb') as f:
+            f.write(_dumps(data))
         
         print(f"\n✓ Saved {len(self.questions)} questions to {filepath}")
         
         # Show summary
-        categories = {}
-        for q in self.questions:
-            cat = q['category']
-            categories[cat] = categories.get(cat, 0) + 1
+        categories = Counter(q['category'] for q in self.questions)
+        
+        lines = ["\nQuestion Categories:"]
+        lines.extend(
+            f"  {cat}: {count}"
+            for cat, count in categories.most_common()
+        )
+        sys.stdout.write('\n'.join(lines) + '\n')
+    
+    def pretty_print(self, filename: str = "manual_test_cases.json"):
+        """Print a saved file indented for reading (it is stored compact)"""
+        filepath = self.output_dir / filename
         
-        print("\nQuestion Categories:")
-        for cat, count in sorted(categories.items(), key=lambda x: x[1], reverse=True):
-            print(f"  {cat}: {count}")
+        if not filepath.exists():
+            print("No saved questions found")
+            return
+        
+        with open(filepath, 'rb') as f:
+            print(_dumps_pretty(_loads(f.read())).decode('utf-8'))
     
     def show_all(self):
         """Display all collected questions"""
@@ -144,15 +196,14 @@ class ManualQuestionCollector:
             print("\nNo questions collected yet")
             return
         
-        print(f"\n{'='*60}")
-        print(f"COLLECTED QUESTIONS ({len(self.questions)} total)")
-        print(f"{'='*60}")
-        
+        # Build the whole listing first so it goes out in a single write
+        lines = [f"\n{'='*60}\nCOLLECTED QUESTIONS ({len(self.questions)} total)\n{'='*60}"]
         for i, q in enumerate(self.questions, 1):
-            print(f"\n{i}. [{q['category']}]")
-            print(f"   {q['title']}")
+            lines.append(f"\n{i}. [{q['category']}]\n   {q['title']}")
             if q['source'] != 'Manual':
-                print(f"   Source: {q['source']}")
+                lines.append(f"   Source: {q['source']}")
+        
+        sys.stdout.write('\n'.join(lines) + '\n')
     
     def delete_question(self, index: int):
         """Delete a question by index"""
@@ -245,9 +296,10 @@ def create_starter_file():
     """Create a starter file with common questions"""
     collector = ManualQuestionCollector()
     
-    for question, category in STARTER_QUESTIONS:
+    ids = collector._take_ids(len(STARTER_QUESTIONS))
+    for qid, (question, category) in zip(ids, STARTER_QUESTIONS):
         collector.questions.append({
-            'id': f"manual_{len(collector.questions) + 1:03d}",
+            'id': qid,
             'title': question,
             'body': '',
             'source': 'Curated',
@@ -261,8 +313,6 @@ def create_starter_file():
     print("Run 'python manual_collection.py' to add more")
 
 if __name__ == "__main__":
-    import sys
-    
     if len(sys.argv) > 1 and sys.argv[1] == 'starter':
         create_starter_file()
     else:
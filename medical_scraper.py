@@ -4,13 +4,29 @@ Downloads patient education articles on hemorrhoids and constipation from truste
 """
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
+from lxml import etree
+import threading
 import time
 import os
+import gzip
+import io
+import itertools
 import json
+import logging
+import queue
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from urllib.parse import urljoin, quote_plus
+from logging.handlers import QueueHandler, QueueListener
+from urllib.parse import urljoin, urlparse
 import re
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
 
 # Trusted medical and academic sites
 TRUSTED_SITES = {
@@ -34,6 +50,120 @@ TRUSTED_SITES = {
     'American College of Gastroenterology': 'https://gi.org'
 }
 
+# class/id patterns that usually mark the main article container
+_CONTENT_CLASS_RE = re.compile(r'content|article|body|text', re.I)
+_CONTENT_ID_RE = re.compile(r'content|article|main', re.I)
+
+# Page furniture removed before looking for article text
+_STRIPPED_TAGS = ('script', 'style', 'nav', 'footer', 'header', 'aside', 'iframe')
+
+# Charset parameter of a Content-Type header
+_CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+
+# Characters dropped when building file names
+_UNSAFE_FILENAME_RE = re.compile(r'[^\w\s-]')
+
+# Pages are truncated past this size; real articles are far smaller
+MAX_PAGE_BYTES = 2_000_000
+
+# Text extraction stops once an article has this many words
+MAX_ARTICLE_WORDS = 5000
+
+# Per-host lists of sitemap URLs, reused by later runs until they are a day
+# old, so newly published articles are picked up
+SITEMAP_CACHE_DIR = '.sitemaps'
+SITEMAP_CACHE_MAX_AGE = 24 * 60 * 60
+# Upper bound on sitemap files read per site (an index plus its children)
+MAX_SITEMAP_FILES = 20
+
+# Minimum seconds between the end of one request to a host and the next
+HOST_REQUEST_INTERVAL = 2
+
+# Sources scraped at the same time; requests to any one host stay sequential
+MAX_SCRAPE_WORKERS = 8
+
+# Known patient education pages per source; sources without an entry
+# fall back to searching their site map
+DIRECT_URLS = MappingProxyType({
+    'Mayo Clinic': (
+        'https://www.mayoclinic.org/diseases-conditions/hemorrhoids/diagnosis-treatment/drc-20360280',
+        'https://www.mayoclinic.org/diseases-conditions/constipation/diagnosis-treatment/drc-20354259',
+        'https://www.mayoclinic.org/diseases-conditions/hemorrhoids/symptoms-causes/syc-20360268',
+        'https://www.mayoclinic.org/diseases-conditions/constipation/symptoms-causes/syc-20354253'
+    ),
+    'Cleveland Clinic': (
+        'https://my.clevelandclinic.org/health/diseases/13142-hemorrhoids',
+        'https://my.clevelandclinic.org/health/diseases/4059-constipation',
+        'https://my.clevelandclinic.org/health/treatments/14632-hemorrhoid-banding',
+        'https://my.clevelandclinic.org/health/diseases/15708-constipation-in-adults'
+    ),
+    'Johns Hopkins': (
+        'https://www.hopkinsmedicine.org/health/conditions-and-diseases/hemorrhoids',
+        'https://www.hopkinsmedicine.org/health/wellness-and-prevention/constipation-causes-and-prevention-tips'
+    ),
+    'WebMD': (
+        'https://www.webmd.com/digestive-disorders/understanding-hemorrhoids-basics',
+        'https://www.webmd.com/digestive-disorders/digestive-diseases-constipation',
+        'https://www.webmd.com/digestive-disorders/understanding-hemorrhoids-treatment',
+        'https://www.webmd.com/digestive-disorders/ss/slideshow-constipation-myths-and-facts'
+    ),
+    'Healthline': (
+        'https://www.healthline.com/health/hemorrhoids',
+        'https://www.healthline.com/health/constipation',
+        'https://www.healthline.com/health/hemorrhoid-treatment-options',
+        'https://www.healthline.com/health/digestive-health/natural-remedies-for-constipation'
+    ),
+    'MedlinePlus': (
+        'https://medlineplus.gov/hemorrhoids.html',
+        'https://medlineplus.gov/constipation.html',
+        'https://medlineplus.gov/ency/article/000292.htm',
+        'https://medlineplus.gov/ency/article/003125.htm'
+    ),
+    'Harvard Health': (
+        'https://www.health.harvard.edu/diseases-and-conditions/hemorrhoids_and_what_to_do_about_them',
+        'https://www.health.harvard.edu/digestive-health/constipation-and-impaction'
+    ),
+    'NHS (UK)': (
+        'https://www.nhs.uk/conditions/piles-haemorrhoids/',
+        'https://www.nhs.uk/conditions/constipation/',
+        'https://www.nhs.uk/conditions/piles-haemorrhoids/treatment/',
+        'https://www.nhs.uk/conditions/constipation/treatment/'
+    ),
+    'Stanford Health Care': (
+        'https://stanfordhealthcare.org/medical-conditions/digestion/hemorrhoids.html',
+        'https://stanfordhealthcare.org/medical-conditions/digestion/constipation.html'
+    ),
+    'UCLA Health': (
+        'https://www.uclahealth.org/medical-services/surgery/colon-rectal-surgery/patient-resources/patient-education/hemorrhoid-disease',
+        'https://www.uclahealth.org/news/what-you-should-know-about-constipation'
+    ),
+    'American Gastroenterological Association': (
+        # Clinical Guidelines - Use landing pages instead of direct journal links
+        'https://gastro.org/clinical-guidance/evaluation-and-management-of-constipation/',
+        'https://gastro.org/clinical-guidance/aga-clinical-practice-update-on-medical-management-of-chronic-idiopathic-constipation/',
+        'https://gastro.org/clinical-guidance/aga-clinical-practice-guideline-on-the-pharmacological-management-of-irritable-bowel-syndrome-with-constipation/',
+        # Patient Education
+        'https://gastro.org/practice-guidance/gi-patient-center/topic/hemorrhoids/',
+        'https://gastro.org/practice-guidance/gi-patient-center/topic/constipation/',
+        'https://gastro.org/practice-guidance/gi-patient-center/topic/irritable-bowel-syndrome-ibs/'
+    ),
+    'American College of Gastroenterology': (
+        # Topic pages (more accessible than journal articles)
+        'https://gi.org/topics/irritable-bowel-syndrome/',
+        'https://gi.org/topics/constipation/',
+        # Patient Information
+        'https://gi.org/patients/gihealth/hemorrhoids/',
+        'https://gi.org/patients/gihealth/constipation/',
+        'https://gi.org/patients/gihealth/irritable-bowel-syndrome/'
+    ),
+    'American Society of Colon and Rectal Surgeons': (
+        # Clinical Practice Guidelines - Use ASCRS toolkit instead of journal
+        'https://fascrs.org/patients/diseases-and-conditions/a-z/hemorrhoids',
+        'https://fascrs.org/patients/diseases-and-conditions/a-z/constipation',
+        'https://fascrs.org/patients/diseases-and-conditions/a-z/irritable-bowel-syndrome-ibs'
+    )
+})
+
 # Topics to search
 TOPICS = [
     'hemorrhoids treatment',
@@ -55,231 +185,269 @@ class MedicalArticleScraper:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
         
+        # Separate session with browser-like headers for journal hosts that
+        # tend to block scrapers, so their connections are reused too
+        self.blocked_session = requests.Session()
+        self.blocked_session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'DNT': '1',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1'
+        })
+        
+        # Transient gateway errors and dropped connections are retried with
+        # backoff; the final status still goes through the checks below
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=('GET',),
+            raise_on_status=False
+        )
+        
+        # Room for a pooled connection per host while sources run in parallel
+        for session in (self.session, self.blocked_session):
+            adapter = HTTPAdapter(pool_connections=64, pool_maxsize=64, max_retries=retry)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
         
-        # Metadata tracking
+        # Metadata tracking; one line per saved article is appended to the
+        # log as it is written, and metadata.json is rebuilt from it
         self.metadata = {
-            'download_date': datetime.now().isoformat(),
-            'articles': []
+            'download_date': datetime.now().isoformat()
         }
+        self.metadata_log = os.path.join(output_dir, 'metadata.jsonl')
         
         # Track blocked URLs for manual download
         self.blocked_urls = []
+        
+        # host -> time.monotonic() before which it must not be contacted again;
+        # the per-host lock keeps workers sharing a host (e.g. search) in line
+        self._next_ok = {}
+        self._host_locks = {}
+        
+        # Suffix for article file names (next() on a count is thread-safe)
+        self._file_seq = itertools.count(1)
     
     def get_direct_urls(self, source_name):
         """Get known direct URLs for patient education on these topics"""
-        direct_urls = {
-            'Mayo Clinic': [
-                'https://www.mayoclinic.org/diseases-conditions/hemorrhoids/diagnosis-treatment/drc-20360280',
-                'https://www.mayoclinic.org/diseases-conditions/constipation/diagnosis-treatment/drc-20354259',
-                'https://www.mayoclinic.org/diseases-conditions/hemorrhoids/symptoms-causes/syc-20360268',
-                'https://www.mayoclinic.org/diseases-conditions/constipation/symptoms-causes/syc-20354253'
-            ],
-            'Cleveland Clinic': [
-                'https://my.clevelandclinic.org/health/diseases/13142-hemorrhoids',
-                'https://my.clevelandclinic.org/health/diseases/4059-constipation',
-                'https://my.clevelandclinic.org/health/treatments/14632-hemorrhoid-banding',
-                'https://my.clevelandclinic.org/health/diseases/15708-constipation-in-adults'
-            ],
-            'Johns Hopkins': [
-                'https://www.hopkinsmedicine.org/health/conditions-and-diseases/hemorrhoids',
-                'https://www.hopkinsmedicine.org/health/wellness-and-prevention/constipation-causes-and-prevention-tips'
-            ],
-            'WebMD': [
-                'https://www.webmd.com/digestive-disorders/understanding-hemorrhoids-basics',
-                'https://www.webmd.com/digestive-disorders/digestive-diseases-constipation',
-                'https://www.webmd.com/digestive-disorders/understanding-hemorrhoids-treatment',
-                'https://www.webmd.com/digestive-disorders/ss/slideshow-constipation-myths-and-facts'
-            ],
-            'Healthline': [
-                'https://www.healthline.com/health/hemorrhoids',
-                'https://www.healthline.com/health/constipation',
-                'https://www.healthline.com/health/hemorrhoid-treatment-options',
-                'https://www.healthline.com/health/digestive-health/natural-remedies-for-constipation'
-            ],
-            'MedlinePlus': [
-                'https://medlineplus.gov/hemorrhoids.html',
-                'https://medlineplus.gov/constipation.html',
-                'https://medlineplus.gov/ency/article/000292.htm',
-                'https://medlineplus.gov/ency/article/003125.htm'
-            ],
-            'Harvard Health': [
-                'https://www.health.harvard.edu/diseases-and-conditions/hemorrhoids_and_what_to_do_about_them',
-                'https://www.health.harvard.edu/digestive-health/constipation-and-impaction'
-            ],
-            'NHS (UK)': [
-                'https://www.nhs.uk/conditions/piles-haemorrhoids/',
-                'https://www.nhs.uk/conditions/constipation/',
-                'https://www.nhs.uk/conditions/piles-haemorrhoids/treatment/',
-                'https://www.nhs.uk/conditions/constipation/treatment/'
-            ],
-            'Stanford Health Care': [
-                'https://stanfordhealthcare.org/medical-conditions/digestion/hemorrhoids.html',
-                'https://stanfordhealthcare.org/medical-conditions/digestion/constipation.html'
-            ],
-            'UCLA Health': [
-                'https://www.uclahealth.org/medical-services/surgery/colon-rectal-surgery/patient-resources/patient-education/hemorrhoid-disease',
-                'https://www.uclahealth.org/news/what-you-should-know-about-constipation'
-            ],
-            'American Gastroenterological Association': [
-                # Clinical Guidelines - Use landing pages instead of direct journal links
-                'https://gastro.org/clinical-guidance/evaluation-and-management-of-constipation/',
-                'https://gastro.org/clinical-guidance/aga-clinical-practice-update-on-medical-management-of-chronic-idiopathic-constipation/',
-                'https://gastro.org/clinical-guidance/aga-clinical-practice-guideline-on-the-pharmacological-management-of-irritable-bowel-syndrome-with-constipation/',
-                # Patient Education
-                'https://gastro.org/practice-guidance/gi-patient-center/topic/hemorrhoids/',
-                'https://gastro.org/practice-guidance/gi-patient-center/topic/constipation/',
-                'https://gastro.org/practice-guidance/gi-patient-center/topic/irritable-bowel-syndrome-ibs/'
-            ],
-            'American College of Gastroenterology': [
-                # Topic pages (more accessible than journal articles)
-                'https://gi.org/topics/irritable-bowel-syndrome/',
-                'https://gi.org/topics/constipation/',
-                # Patient Information
-                'https://gi.org/patients/gihealth/hemorrhoids/',
-                'https://gi.org/patients/gihealth/constipation/',
-                'https://gi.org/patients/gihealth/irritable-bowel-syndrome/'
-            ],
-            'American Society of Colon and Rectal Surgeons': [
-                # Clinical Practice Guidelines - Use ASCRS toolkit instead of journal
-                'https://fascrs.org/patients/diseases-and-conditions/a-z/hemorrhoids',
-                'https://fascrs.org/patients/diseases-and-conditions/a-z/constipation',
-                'https://fascrs.org/patients/diseases-and-conditions/a-z/irritable-bowel-syndrome-ibs'
-            ]
-        }
-        return direct_urls.get(source_name, [])
+        return DIRECT_URLS.get(source_name, ())
     
-    def search_google_site(self, site_url, topic, num_results=5):
-        """Search Google for articles on a specific site"""
-        query = f"site:{site_url} {topic}"
-        search_url = f"https://www.google.com/search?q={quote_plus(query)}&num={num_results}"
+    def _sitemap_locs(self, data):
+        """Split the <loc> entries of one sitemap into (pages, child sitemaps)"""
+        if data[:2] == b'\x1f\x8b':  # .xml.gz sitemaps are served compressed
+            data = gzip.decompress(data)
         
-        try:
-            response = self.session.get(search_url, timeout=10)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            urls = []
-            # Try different selectors for Google results
-            for result in soup.find_all(['div'], class_=['g', 'Gx5Zad']):
-                link = result.find('a', href=True)
-                if link:
-                    url = link['href']
-                    # Clean up Google redirect URLs
-                    if '/url?q=' in url:
-                        url = url.split('/url?q=')[1].split('&')[0]
-                    if url.startswith('http') and site_url in url:
-                        urls.append(url)
-            
-            # Also try citation tags
-            for cite in soup.find_all('cite'):
-                url = cite.get_text()
-                if url.startswith('http'):
-                    urls.append(url)
-            
-            return list(set(urls))[:num_results]  # Remove duplicates
-            
-        except Exception as e:
-            print(f"    Error searching Google: {e}")
-            return []
+        pages, children = [], []
+        for _, loc in etree.iterparse(io.BytesIO(data), tag='{*}loc', resolve_entities=False):
+            parent = loc.getparent()
+            is_index_entry = parent is not None and etree.QName(parent).localname == 'sitemap'
+            (children if is_index_entry else pages).append((loc.text or '').strip())
+            loc.clear()
+        return pages, children
+    
+    def fetch_sitemap(self, site_url):
+        """List the page URLs in a site's sitemap, cached on disk per host"""
+        host = urlparse(site_url).netloc
+        cache_path = os.path.join(SITEMAP_CACHE_DIR, f"{host}.txt")
+        
+        if (os.path.exists(cache_path)
+                and time.time() - os.path.getmtime(cache_path) < SITEMAP_CACHE_MAX_AGE):
+            with open(cache_path, encoding='utf-8') as f:
+                return f.read().split()
+        
+        urls = []
+        pending = deque([urljoin(site_url, '/sitemap.xml')])
+        fetched = 0
+        
+        # Sitemap indexes point at further sitemaps; follow a bounded number
+        while pending and fetched < MAX_SITEMAP_FILES:
+            sitemap_url = pending.popleft()
+            fetched += 1
+            try:
+                response = self._polite_get(self.session, sitemap_url, timeout=15)
+                if response.status_code != 200:
+                    continue
+                pages, children = self._sitemap_locs(response.content)
+            except (requests.exceptions.RequestException, etree.XMLSyntaxError, OSError) as e:
+                logger.warning("Error reading sitemap %s: %s", sitemap_url, e)
+                continue
+            urls.extend(pages)
+            pending.extend(children)
+        
+        # Only a successful read is cached, so a failed fetch is retried next run
+        if urls:
+            os.makedirs(SITEMAP_CACHE_DIR, exist_ok=True)
+            # Written aside and moved into place, so an interrupted run
+            # never leaves a truncated list behind
+            tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(urls))
+            os.replace(tmp_path, cache_path)
+        
+        return urls
+    
+    def search_site(self, site_url, topic, num_results=5):
+        """Find articles on a site whose URL mentions the topic's words"""
+        keywords = topic.lower().split()
+        
+        scored = []
+        for url in self.fetch_sitemap(site_url):
+            url_lower = url.lower()
+            hits = sum(keyword in url_lower for keyword in keywords)
+            if hits:
+                scored.append((hits, url))
+        
+        # Most keywords matched first; ties keep sitemap order
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [url for _, url in scored[:num_results]]
     
     def clean_text(self, text):
         """Clean extracted text"""
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
-        # Remove multiple newlines
-        text = re.sub(r'\n+', '\n', text)
-        return text.strip()
+        # Collapse every whitespace run (newlines included) to a single space
+        return ' '.join(text.split())
+    
+    def _polite_get(self, session, url, **kwargs):
+        """GET url, first waiting out the rate limit for its host"""
+        host = urlparse(url).netloc
+        with self._host_locks.setdefault(host, threading.Lock()):
+            delay = self._next_ok.get(host, 0) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                return session.get(url, **kwargs)
+            finally:
+                # Be respectful with rate limiting: the gap runs from the end of
+                # this request, and time spent parsing and saving counts toward it
+                self._next_ok[host] = time.monotonic() + HOST_REQUEST_INTERVAL
+    
+    def _read_capped(self, response):
+        """Read a streamed response body, stopping after MAX_PAGE_BYTES"""
+        chunks = []
+        total = 0
+        for chunk in response.iter_content(chunk_size=65536):
+            chunks.append(chunk)
+            total += len(chunk)
+            if total >= MAX_PAGE_BYTES:
+                logger.warning("⚠ Page larger than %d bytes, truncated url=%s", MAX_PAGE_BYTES, response.url)
+                break
+        return b''.join(chunks)
+    
+    def _find_main_content(self, tree):
+        """First <article>, <main>, or div whose class/id looks like the body"""
+        for tag in ('article', 'main'):
+            element = tree.find(f'.//{tag}')
+            if element is not None:
+                return element
+        
+        for attr, pattern in (('class', _CONTENT_CLASS_RE), ('id', _CONTENT_ID_RE)):
+            for div in tree.iter('div'):
+                if pattern.search(div.get(attr, '')):
+                    return div
+        
+        return None
+    
+    def _collect_text(self, nodes):
+        """Gather substantial text blocks until MAX_ARTICLE_WORDS is reached"""
+        content_text = []
+        word_count = 0
+        for node in nodes:
+            text = node.text_content().strip()
+            if len(text) > 30:  # Reduced threshold
+                content_text.append(text)
+                word_count += len(text.split())
+                if word_count >= MAX_ARTICLE_WORDS:
+                    break
+        return content_text, word_count
     
     def extract_article_content(self, url):
         """Extract article content from URL"""
         try:
-            print(f"      Fetching URL...")
+            logger.debug("Fetching url=%s", url)
             
             # Check if it's a PDF or journal article
             if url.endswith('.pdf'):
-                print(f"      ⚠ PDF detected - skipping (download manually)")
+                logger.warning("⚠ PDF skipped, download manually url=%s", url)
                 return None
             
             # Check if it's a journal that typically blocks scraping
             blocked_domains = ['lww.com', 'journals.', 'article', 'fulltext']
             if any(domain in url for domain in blocked_domains):
-                print(f"      ⚠ Journal article detected - may require manual access")
-                print(f"      → Visit URL directly to access: {url}")
+                logger.warning("⚠ Journal article, may require manual access url=%s", url)
                 # Still try, but with different headers
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.5',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'DNT': '1',
-                    'Connection': 'keep-alive',
-                    'Upgrade-Insecure-Requests': '1'
-                }
-                response = requests.get(url, timeout=15, headers=headers, allow_redirects=True)
+                response = self._polite_get(self.blocked_session, url, timeout=15, allow_redirects=True, stream=True)
             else:
-                response = self.session.get(url, timeout=15)
+                response = self._polite_get(self.session, url, timeout=15, stream=True)
             
-            if response.status_code == 403:
-                print(f"      ✗ Access denied (403) - website blocking automated access")
-                print(f"      → Bookmark for manual download: {url}")
-                # Save to a separate list for manual download
-                self.blocked_urls.append(url)
-                return None
-            elif response.status_code == 404:
-                print(f"      ✗ Not found (404)")
-                return None
-            elif response.status_code != 200:
-                print(f"      ✗ HTTP {response.status_code}")
-                return None
+            # Streamed, so the body is only downloaded once the checks pass
+            with response:
+                if response.status_code == 403:
+                    logger.warning("✗ Access denied (403), bookmarked for manual download url=%s", url)
+                    # Save to a separate list for manual download
+                    self.blocked_urls.append(url)
+                    return None
+                elif response.status_code == 404:
+                    logger.info("✗ Not found (404) url=%s", url)
+                    return None
+                elif response.status_code != 200:
+                    logger.info("✗ HTTP %d url=%s", response.status_code, url)
+                    return None
+                
+                content_type = response.headers.get('Content-Type', '')
+                if 'html' not in content_type and 'xml' not in content_type:
+                    logger.info("✗ Not a web page (%s) url=%s", content_type or 'unknown type', url)
+                    return None
+                
+                page = self._read_capped(response)
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+            # libxml2 honours <meta charset> on its own; a charset in the
+            # Content-Type header takes precedence, as browsers do
+            charset = _CHARSET_RE.search(content_type)
+            parser = lxml.html.HTMLParser(
+                encoding=charset.group(1) if charset else None,
+                remove_comments=True
+            )
+            tree = lxml.html.document_fromstring(page, parser=parser)
             
             # Remove script, style, nav, footer elements
-            for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside', 'iframe']):
-                element.decompose()
+            etree.strip_elements(tree, *_STRIPPED_TAGS, with_tail=False)
             
             # Try to find article title
             title = None
             for tag in ['h1', 'title']:
-                title_elem = soup.find(tag)
-                if title_elem:
-                    title = title_elem.get_text().strip()
+                title_elem = tree.find(f'.//{tag}')
+                if title_elem is not None:
+                    title = title_elem.text_content().strip()
                     break
             
             # Try to find main content with multiple strategies
-            content_text = []
+            content_text, word_count = [], 0
             
             # Strategy 1: Look for article/main content containers
-            main_content = (
-                soup.find('article') or 
-                soup.find('main') or 
-                soup.find('div', class_=re.compile(r'content|article|body|text', re.I)) or
-                soup.find('div', id=re.compile(r'content|article|main', re.I))
-            )
+            main_content = self._find_main_content(tree)
             
-            if main_content:
-                # Extract paragraphs from main content
-                for p in main_content.find_all(['p', 'li', 'div'], recursive=True):
-                    text = p.get_text().strip()
-                    if len(text) > 30:  # Reduced threshold
-                        content_text.append(text)
+            if main_content is not None:
+                # Paragraphs and list items only: a div repeats the text of
+                # everything nested inside it
+                content_text, word_count = self._collect_text(main_content.iter('p', 'li'))
             
             # Strategy 2: If still empty, get all paragraphs
             if not content_text:
-                for p in soup.find_all('p'):
-                    text = p.get_text().strip()
-                    if len(text) > 30:
-                        content_text.append(text)
+                content_text, word_count = self._collect_text(tree.iter('p'))
             
             # Combine content
             full_content = '\n\n'.join(content_text)
-            word_count = len(full_content.split())
             
-            print(f"      Extracted {word_count} words")
+            logger.debug("Extracted %d words url=%s", word_count, url)
             
             if word_count < 50:
-                print(f"      ✗ Too short ({word_count} words)")
+                logger.info("✗ Too short (%d words) url=%s", word_count, url)
                 return None
             
             return {
@@ -290,72 +458,95 @@ class MedicalArticleScraper:
             }
             
         except requests.exceptions.Timeout:
-            print(f"      ✗ Timeout")
+            logger.warning("✗ Timeout url=%s", url)
             return None
         except requests.exceptions.RequestException as e:
-            print(f"      ✗ Request error: {e}")
+            logger.warning("✗ Request error url=%s: %s", url, e)
             return None
-        except Exception as e:
-            print(f"      ✗ Error: {e}")
+        except Exception:
+            logger.exception("✗ Error url=%s", url)
             return None
     
     def save_article(self, article_data, source_name, topic):
         """Save article to file"""
         if not article_data:
-            print(f"      ✗ No article data")
+            logger.info("✗ No article data")
             return False
             
         if not article_data['content']:
-            print(f"      ✗ Empty content")
+            logger.info("✗ Empty content url=%s", article_data['url'])
             return False
         
         if article_data['word_count'] < 50:
-            print(f"      ✗ Too short ({article_data['word_count']} words)")
+            logger.info("✗ Too short (%d words) url=%s", article_data['word_count'], article_data['url'])
             return False
         
         try:
             # Create sanitized filename
-            safe_title = re.sub(r'[^\w\s-]', '', article_data['title'])[:50]
-            safe_source = re.sub(r'[^\w\s-]', '', source_name)
-            safe_topic = re.sub(r'[^\w\s-]', '', topic)
+            safe_title = _UNSAFE_FILENAME_RE.sub('', article_data['title'])[:50]
+            safe_source = _UNSAFE_FILENAME_RE.sub('', source_name)
+            safe_topic = _UNSAFE_FILENAME_RE.sub('', topic)
             
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{safe_source}_{safe_topic}_{timestamp}.txt"
+            # The run-wide sequence number keeps names unique when two saves
+            # for the same source and topic land in the same second
+            now = datetime.now()
+            timestamp = now.strftime('%Y%m%d_%H%M%S')
+            filename = f"{safe_source}_{safe_topic}_{timestamp}_{next(self._file_seq):03d}.txt"
             filepath = os.path.join(self.output_dir, filename)
             
-            # Write article
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(f"Title: {article_data['title']}\n")
-                f.write(f"Source: {source_name}\n")
-                f.write(f"URL: {article_data['url']}\n")
-                f.write(f"Topic: {topic}\n")
-                f.write(f"Word Count: {article_data['word_count']}\n")
-                f.write(f"Downloaded: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write("="*80 + "\n\n")
-                f.write(article_data['content'])
+            # Write article: header and body encoded once and written together
+            payload = (
+                f"Title: {article_data['title']}\n"
+                f"Source: {source_name}\n"
+                f"URL: {article_data['url']}\n"
+                f"Topic: {topic}\n"
+                f"Word Count: {article_data['word_count']}\n"
+                f"Downloaded: {now.strftime('%Y-%m-%d %H:%M:%S')}\n"
+                + "="*80 + "\n\n"
+                + article_data['content']
+            ).encode('utf-8')
+            fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+            try:
+                view = memoryview(payload)
+                while view:
+                    view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
             
             # Add to metadata
-            self.metadata['articles'].append({
+            record = json.dumps({
                 'filename': filename,
                 'title': article_data['title'],
                 'source': source_name,
                 'url': article_data['url'],
                 'topic': topic,
                 'word_count': article_data['word_count']
-            })
+            }) + '\n'
+            # A single O_APPEND write lands whole even with parallel workers
+            fd = os.open(self.metadata_log, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, record.encode('utf-8'))
+            finally:
+                os.close(fd)
             
-            print(f"      ✓ Saved: {article_data['title'][:50]}... ({article_data['word_count']} words)")
+            logger.info("✓ Saved %s... (%d words) url=%s",
+                        article_data['title'][:50], article_data['word_count'], article_data['url'])
             return True
             
-        except Exception as e:
-            print(f"      ✗ Save error: {e}")
+        except Exception:
+            logger.exception("✗ Save error url=%s", article_data['url'])
             return False
     
     def save_metadata(self):
         """Save metadata JSON file"""
+        articles = []
+        if os.path.exists(self.metadata_log):
+            with open(self.metadata_log, encoding='utf-8') as f:
+                articles = [json.loads(line) for line in f if line.strip()]
+        
         metadata_path = os.path.join(self.output_dir, 'metadata.json')
         with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, indent=2)
+            json.dump({**self.metadata, 'articles': articles}, f, indent=2)
         print(f"\n✓ Metadata saved to {metadata_path}")
         
         # Save blocked URLs to a separate file
@@ -369,77 +560,71 @@ class MedicalArticleScraper:
             print(f"✓ Blocked URLs saved to {blocked_path}")
             print(f"  ({len(self.blocked_urls)} URLs require manual download)")
     
-    def scrape_all(self):
-        """Main scraping function"""
-        print("Starting medical article scraping...\n")
-        print(f"Searching {len(TRUSTED_SITES)} trusted medical sources")
-        print(f"Using direct URLs + web search\n")
+    def scrape_source(self, source_name, site_url):
+        """Scrape one source; returns the number of articles saved"""
+        logger.info("Searching: %s", source_name)
         
-        total_downloaded = 0
+        downloaded = 0
         
-        for source_name, site_url in TRUSTED_SITES.items():
-            print(f"\n{'='*60}")
-            print(f"Searching: {source_name}")
-            print(f"{'='*60}")
-            
-            # First, try direct URLs if available
-            direct_urls = self.get_direct_urls(source_name)
+        # First, try direct URLs if available
+        direct_urls = self.get_direct_urls(source_name)
+        
+        if direct_urls:
+            logger.info("%s: using %d known URLs", source_name, len(direct_urls))
             
-            if direct_urls:
-                print(f"  Using {len(direct_urls)} known URLs...")
+            for url in direct_urls:
+                article_data = self.extract_article_content(url)
+                
+                if article_data:
+                    # Determine topic from URL
+                    url_lower = url.lower()
+                    if 'hemorrhoid' in url_lower or 'pile' in url_lower:
+                        topic = 'hemorrhoids'
+                    elif 'constipation' in url_lower:
+                        topic = 'constipation'
+                    elif 'ibs' in url_lower or 'irritable' in url_lower:
+                        topic = 'IBS'
+                    elif 'guideline' in url_lower or 'practice' in url_lower:
+                        topic = 'clinical_guideline'
+                    else:
+                        topic = 'general'
+                        
+                    if self.save_article(article_data, source_name, topic):
+                        downloaded += 1
+        
+        # Then try the site map as backup
+        else:
+            logger.info("%s: no direct URLs, searching the site map", source_name)
+            for topic in TOPICS[:2]:  # Limit topics for sources without direct URLs
+                # Search for URLs
+                urls = self.search_site(site_url, topic, num_results=2)
+                
+                if not urls:
+                    logger.info("%s: no results for topic %r", source_name, topic)
+                    continue
                 
-                for url in direct_urls:
-                    print(f"\n    → {url}")
+                logger.info("%s: found %d potential articles for topic %r", source_name, len(urls), topic)
+                
+                # Download each article
+                for url in urls:
                     article_data = self.extract_article_content(url)
                     
-                    if article_data:
-                        # Determine topic from URL
-                        url_lower = url.lower()
-                        if 'hemorrhoid' in url_lower or 'pile' in url_lower:
-                            topic = 'hemorrhoids'
-                        elif 'constipation' in url_lower:
-                            topic = 'constipation'
-                        elif 'ibs' in url_lower or 'irritable' in url_lower:
-                            topic = 'IBS'
-                        elif 'guideline' in url_lower or 'practice' in url_lower:
-                            topic = 'clinical_guideline'
-                        else:
-                            topic = 'general'
-                            
+                    if article_data and article_data['word_count'] > 100:
                         if self.save_article(article_data, source_name, topic):
-                            total_downloaded += 1
-                    
-                    # Be respectful with rate limiting
-                    time.sleep(2)
-            
-            # Then try web search as backup
-            else:
-                print(f"  No direct URLs, trying web search...")
-                for topic in TOPICS[:2]:  # Limit topics for sources without direct URLs
-                    print(f"\n    Topic: {topic}")
-                    
-                    # Search for URLs
-                    urls = self.search_google_site(site_url, topic, num_results=2)
-                    
-                    if not urls:
-                        print(f"      No results found")
-                        continue
-                    
-                    print(f"      Found {len(urls)} potential articles")
-                    
-                    # Download each article
-                    for url in urls:
-                        article_data = self.extract_article_content(url)
-                        
-                        if article_data and article_data['word_count'] > 100:
-                            if self.save_article(article_data, source_name, topic):
-                                total_downloaded += 1
-                        
-                        # Be respectful with rate limiting
-                        time.sleep(2)
-                    
-                    # Longer pause between topics
-                    time.sleep(3)
+                            downloaded += 1
+        
+        return downloaded
+    
+    def scrape_all(self):
+        """Main scraping function"""
+        print("Starting medical article scraping...\n")
+        print(f"Searching {len(TRUSTED_SITES)} trusted medical sources")
+        print(f"Using direct URLs + site maps\n")
+        
+        # Each source is its own host, so sources run side by side while
+        # _polite_get keeps every single host at the polite rate
+        with ThreadPoolExecutor(max_workers=MAX_SCRAPE_WORKERS) as pool:
+            total_downloaded = sum(pool.map(lambda item: self.scrape_source(*item), TRUSTED_SITES.items()))
         
         # Save metadata
         self.save_metadata()
@@ -452,8 +637,21 @@ class MedicalArticleScraper:
 
 def main():
     """Run the scraper"""
-    scraper = MedicalArticleScraper(output_dir='medical_articles')
-    scraper.scrape_all()
+    # Worker threads only enqueue log records; the listener thread writes them
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    listener = QueueListener(log_queue, handler)
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(QueueHandler(log_queue))
+    listener.start()
+    
+    try:
+        scraper = MedicalArticleScraper(output_dir='medical_articles')
+        scraper.scrape_all()
+    finally:
+        listener.stop()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
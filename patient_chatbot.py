@@ -7,6 +7,7 @@ import os
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
 
 import re
+from functools import lru_cache
 from typing import List, Dict
 from datetime import datetime
 from dotenv import load_dotenv
@@ -19,7 +20,7 @@ from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.messages import HumanMessage, AIMessage
 
-from conversation_memory import ConversationMemory
+from conversation_memory import ConversationMemory, Message
 
 # Suppress warnings
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
@@ -137,13 +138,13 @@ def create_red_flag_warning(red_flags: List[str]) -> str:
 def format_docs(docs):
     return "\n\n".join(doc.page_content for doc in docs)
 
-def format_chat_history(messages: List[Dict]) -> List:
+def format_chat_history(messages: List[Message]) -> List:
     formatted = []
     for msg in messages:
-        if msg['role'] == 'user':
-            formatted.append(HumanMessage(content=msg['content']))
+        if msg.role == 'user':
+            formatted.append(HumanMessage(content=msg.content))
         else:
-            formatted.append(AIMessage(content=msg['content']))
+            formatted.append(AIMessage(content=msg.content))
     return formatted
 
 class PatientChatbot:
@@ -258,7 +259,8 @@ class PatientChatbot:
 # MAIN
 # ============================================================================
 
-def load_vectorstore(persist_directory: str = "./faiss_index"):
+@lru_cache(maxsize=4)
+def _load_vectorstore_cached(persist_directory: str, index_mtime):
     print(f"Loading vector store from {persist_directory}...")
     embeddings = OpenAIEmbeddings()
     vectorstore = FAISS.load_local(
@@ -269,6 +271,14 @@ def load_vectorstore(persist_directory: str = "./faiss_index"):
     print("✓ Vector store loaded")
     return vectorstore
 
+def load_vectorstore(persist_directory: str = "./faiss_index"):
+    # Reuse an index already loaded in this process; the mtime in the key
+    # makes a rebuilt index (python rag_setup.py) load fresh
+    persist_directory = os.path.abspath(persist_directory)
+    index_file = os.path.join(persist_directory, "index.faiss")
+    index_mtime = os.path.getmtime(index_file) if os.path.exists(index_file) else None
+    return _load_vectorstore_cached(persist_directory, index_mtime)
+
 def main():
     print("="*80)
     print("Patient Assistant - Hemorrhoids & Constipation")
@@ -3,8 +3,13 @@ RAG Vectorstore Setup
 Run this once to create the vectorstore from your documents
 """
 
+import hashlib
 import os
+import sqlite3
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+import faiss
 from dotenv import load_dotenv
 from langchain_community.document_loaders import (
     PyPDFLoader,
@@ -15,6 +20,7 @@ from langchain_community.document_loaders import (
     UnstructuredHTMLLoader,
 )
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings
 
@@ -27,9 +33,25 @@ load_dotenv()
 # Configuration
 DOCUMENTS_FOLDER = "./documents"
 FAISS_INDEX_PATH = "./faiss_index"
+# Vectors keyed by content hash; kept outside the index so rebuilds only
+# embed chunks that changed
+EMBEDDING_CACHE_PATH = "./embeddings_cache.sqlite"
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
+# Texts per embeddings request, and how many requests are in flight at once
+EMBED_BATCH_SIZE = 1000
+EMBED_WORKERS = 8
+
+# Above this many chunks the index is an approximate HNSW graph instead of an
+# exact flat scan; efSearch trades a little speed for recall at query time
+HNSW_MIN_CHUNKS = 20000
+HNSW_NEIGHBORS = 32
+HNSW_EF_SEARCH = 64
+
+# Splitting is only farmed out to worker processes for larger corpora
+PARALLEL_SPLIT_MIN_DOCUMENTS = 64
+
 def load_documents():
     """Load all supported documents from the documents folder."""
     if not Path(DOCUMENTS_FOLDER).exists():
@@ -51,12 +73,11 @@ def load_documents():
     all_documents = []
     supported_extensions = list(loader_mapping.keys())
     
-    document_files = []
-    for ext in supported_extensions:
-        document_files.extend(Path(DOCUMENTS_FOLDER).glob(f"*{ext}"))
-        document_files.extend(Path(DOCUMENTS_FOLDER).glob(f"**/*{ext}"))
-    
-    document_files = list(set(document_files))
+    # One walk of the tree; suffixes compare case-insensitively so .PDF counts
+    document_files = sorted(
+        path for path in Path(DOCUMENTS_FOLDER).rglob('*')
+        if path.suffix.lower() in loader_mapping and path.is_file()
+    )
     
     if not document_files:
         print(f"No supported documents found in {DOCUMENTS_FOLDER}")
@@ -85,25 +106,97 @@ def load_documents():
     
     return all_documents
 
-def chunk_documents(documents):
-    """Split documents into chunks."""
-    print(f"\nChunking {len(documents)} documents...")
+def _split_batch(documents):
+    """Split one batch of documents (runs in a worker process)."""
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
         separators=["\n\n", "\n", ". ", " ", ""]
     )
-    chunks = splitter.split_documents(documents)
+    return splitter.split_documents(documents)
+
+def chunk_documents(documents):
+    """Split documents into chunks."""
+    print(f"\nChunking {len(documents)} documents...")
+    if len(documents) < PARALLEL_SPLIT_MIN_DOCUMENTS:
+        chunks = _split_batch(documents)
+    else:
+        # Each document splits independently, so batches can use every core
+        workers = os.cpu_count() or 1
+        step = -(-len(documents) // workers)
+        batches = [documents[i:i + step] for i in range(0, len(documents), step)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = [chunk for batch in pool.map(_split_batch, batches) for chunk in batch]
     print(f"✓ Created {len(chunks)} chunks")
     return chunks
 
+def _embed_batches(embeddings, texts):
+    """Embed texts in large batches, several requests at a time."""
+    batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+        return [vector for batch in pool.map(embeddings.embed_documents, batches) for vector in batch]
+
+def embed_texts(embeddings, texts):
+    """Embed texts, only sending those missing from the on-disk cache."""
+    # The model name is part of the key so switching models never reuses vectors
+    model = getattr(embeddings, 'model', '')
+    keys = [hashlib.sha256(f"{model}\0{text}".encode('utf-8')).digest() for text in texts]
+    
+    db = sqlite3.connect(EMBEDDING_CACHE_PATH)
+    try:
+        db.execute("CREATE TABLE IF NOT EXISTS embeddings (hash BLOB PRIMARY KEY, vec BLOB)")
+        
+        cached = {}
+        unique_keys = list(set(keys))
+        for i in range(0, len(unique_keys), 500):
+            part = unique_keys[i:i + 500]
+            placeholders = ','.join('?' * len(part))
+            cached.update(db.execute(
+                f"SELECT hash, vec FROM embeddings WHERE hash IN ({placeholders})", part
+            ))
+        
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        
+        print(f"  {len(missing)} of {len(texts)} chunks need new embeddings")
+        
+        if missing:
+            vectors = _embed_batches(embeddings, list(missing.values()))
+            rows = [(key, array('f', vector).tobytes()) for key, vector in zip(missing, vectors)]
+            with db:
+                db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)", rows)
+            cached.update(rows)
+    finally:
+        db.close()
+    
+    # Every vector comes back through float32, cached or not, so a rebuild
+    # gives the same index whichever path each chunk took
+    return [array('f', cached[key]).tolist() for key in keys]
+
+def build_hnsw_vectorstore(embeddings, texts, vectors, metadatas):
+    """Build a FAISS store backed by an HNSW graph for sub-linear search."""
+    # L2 like the default flat index, so scores keep their meaning once loaded;
+    # for normalized OpenAI vectors the ranking equals inner product anyway
+    index = faiss.index_factory(len(vectors[0]), f"HNSW{HNSW_NEIGHBORS}")
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    vectorstore = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={}
+    )
+    vectorstore.add_embeddings(zip(texts, vectors), metadatas=metadatas)
+    return vectorstore
+
 def create_vectorstore(force_rebuild=False):
     """Create or load the vectorstore"""
     print("\n" + "="*60)
     print("RAG Vectorstore Setup")
     print("="*60 + "\n")
     
-    embeddings = OpenAIEmbeddings()
+    embeddings = OpenAIEmbeddings(chunk_size=EMBED_BATCH_SIZE, max_retries=6, request_timeout=60)
     
     if Path(FAISS_INDEX_PATH).exists() and not force_rebuild:
         print(f"Vectorstore already exists at {FAISS_INDEX_PATH}")
@@ -124,10 +217,21 @@ def create_vectorstore(force_rebuild=False):
         return
     
     print("\nCreating vector store (this may take a moment)...")
-    vectorstore = FAISS.from_documents(
-        documents=chunks,
-        embedding=embeddings
-    )
+    texts = [chunk.page_content for chunk in chunks]
+    metadatas = [chunk.metadata for chunk in chunks]
+    # Only the plain lists are needed from here on; free the Document copies
+    # before the vectors and the index are built
+    del documents, chunks
+    
+    vectors = embed_texts(embeddings, texts)
+    if len(vectors) < HNSW_MIN_CHUNKS:
+        vectorstore = FAISS.from_embeddings(
+            text_embeddings=zip(texts, vectors),
+            embedding=embeddings,
+            metadatas=metadatas
+        )
+    else:
+        vectorstore = build_hnsw_vectorstore(embeddings, texts, vectors, metadatas)
     
     vectorstore.save_local(FAISS_INDEX_PATH)
     print(f"✓ Vector store saved to {FAISS_INDEX_PATH}")
@@ -4,24 +4,176 @@ Identify patterns in failures and generate improvement recommendations
 """
 
 import json
+import re
+import sys
+from sys import intern
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List, Tuple
 from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+
+    def _dumps(data) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(data) -> bytes:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+    _loads = json.loads
+
+# One scan classifies an issue string. The lookahead lets matches overlap so
+# no phrase can hide another, and group order is the reporting order.
+_ISSUE_RE = re.compile(
+    r'(?=(?P<missing_red_flag_warning>red flag|warning)'
+    r'|(?P<inappropriate_diagnosis>diagnos)'
+    r'|(?P<inappropriate_prescription>prescrib|medication)'
+    r'|(?P<poor_empathy>empathy|tone)'
+    r'|(?P<too_vague>specific|vague)'
+    r'|(?P<medical_inaccuracy>inaccura|incorrect))',
+    re.IGNORECASE
+)
+
+@lru_cache(maxsize=4096)
+def _classify_issue(issue: str) -> Tuple[str, ...]:
+    """Issue types mentioned in an issue string, in reporting order"""
+    hits = {match.lastgroup for match in _ISSUE_RE.finditer(issue)}
+    return tuple(sorted(hits, key=_ISSUE_RE.groupindex.__getitem__))
+
+# Scored dimensions of a judge evaluation, in reporting order
+_DIMENSIONS = ('medical_accuracy', 'safety', 'patient_friendliness',
+               'actionability', 'scope_appropriateness')
+
+# Parts of the results file picked out by the streaming parser
+_STREAMED_ROOTS = frozenset(('summary', 'detailed_results.item', 'evaluated_at'))
+
+# Recommendation priorities, most urgent first, for sorting
+PRIORITY_RANK = {'CRITICAL': 0, 'HIGH': 1, 'MEDIUM': 2, 'LOW': 3}
+
+# Shared read-only defaults for missing sections; never mutated
+_EMPTY = {}
+_NO_ISSUES = ()
+
+def _intern_labels(result: Dict) -> Dict:
+    """Share the category and evaluation key strings repeated in every result"""
+    # ijson builds fresh key strings for each record, unlike json.load
+    if 'category' in result:
+        result['category'] = intern(result['category'])
+    evaluation = result.get('evaluation')
+    if isinstance(evaluation, dict):
+        result['evaluation'] = {
+            intern(key): ({intern(k): v for k, v in value.items()} if isinstance(value, dict) else value)
+            for key, value in evaluation.items()
+        }
+    return result
+
+@dataclass
+class FailureScan:
+    """Everything derived from one pass over the detailed results"""
+    failures: List[Dict] = field(default_factory=list)
+    by_category: Dict[str, List[Dict]] = field(default_factory=lambda: defaultdict(list))
+    dimension_issues: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    issue_keywords: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
 
 class ResultsAnalyzer:
     """Analyze test results and provide actionable insights"""
     
-    def __init__(self, results_file: str = "test_results/evaluation_results.json"):
+    def __init__(self, results_file: str = "test_results/evaluation_results.json",
+                 materialize: bool = False):
         self.results_file = Path(results_file)
+        self._scan_cache = None
+        self._pending = None
         
         if not self.results_file.exists():
             raise FileNotFoundError(f"Results file not found: {results_file}")
         
-        with open(self.results_file, 'r') as f:
-            self.data = json.load(f)
+        if ijson is None:
+            # No streaming parser available: load everything up front
+            with open(self.results_file, 'rb') as f:
+                data = _loads(f.read())
+            self.summary = data['summary']
+            self.detailed_results = data['detailed_results']
+            self._evaluated_at = data.get('evaluated_at')
+            return
+        
+        # A single pass over the file: it is read just past the summary now and
+        # resumed by the first iter_results call, which also picks up
+        # evaluated_at on the way out
+        self.summary = None
+        self.detailed_results = None
+        self._evaluated_at = None
+        self._pending = self._parse_results_file()
+        self._buffered = []
+        for result in self._pending:
+            self._buffered.append(result)
+            if self.summary is not None:
+                break
+        if self.summary is None:
+            raise KeyError('summary')
+        
+        if materialize:
+            self.detailed_results = [_intern_labels(result) for result in self.iter_results()]
+    
+    def _parse_results_file(self) -> Iterator[Dict]:
+        """Stream the results file once, setting summary and evaluated_at and yielding each detailed result"""
+        with open(self.results_file, 'rb') as f:
+            builder = None
+            for prefix, event, value in ijson.parse(f, use_float=True):
+                if builder is not None:
+                    builder.event(event, value)
+                    if prefix != root or event not in ('end_map', 'end_array'):
+                        continue
+                    value = builder.value
+                    builder = None
+                elif prefix not in _STREAMED_ROOTS:
+                    continue
+                elif event in ('start_map', 'start_array'):
+                    root = prefix
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                    continue
+                else:
+                    root = prefix
+                
+                if root == 'detailed_results.item':
+                    yield value
+                elif root == 'summary':
+                    self.summary = value
+                else:
+                    self._evaluated_at = value
+    
+    def iter_results(self) -> Iterator[Dict]:
+        """Yield detailed results one at a time"""
+        if self.detailed_results is not None:
+            yield from self.detailed_results
+            return
+        
+        if self._pending is not None:
+            # Carry on with the pass __init__ started
+            pending, self._pending = self._pending, None
+            buffered, self._buffered = self._buffered, []
+            yield from buffered
+            yield from pending
+            return
         
-        self.summary = self.data['summary']
-        self.detailed_results = self.data['detailed_results']
+        yield from self._parse_results_file()
+    
+    @property
+    def evaluated_at(self):
+        """Timestamp of the evaluation run; read separately only if no full pass has reached it"""
+        if self._evaluated_at is None and ijson is not None:
+            with open(self.results_file, 'rb') as f:
+                self._evaluated_at = next(ijson.items(f, 'evaluated_at'), None)
+        return self._evaluated_at
     
     def print_overview(self):
         """Print high-level summary"""
@@ -47,95 +199,89 @@ class ResultsAnalyzer:
         for range_name, count in s['score_distribution'].items():
             print(f"   {range_name}: {count} cases")
     
-    def find_failures(self) -> List[Dict]:
-        """Get all failed test cases"""
-        failures = []
-        
-        for result in self.detailed_results:
-            eval_data = result.get('evaluation', {})
+    def _scan(self) -> FailureScan:
+        """Walk the detailed results once, computing every failure statistic"""
+        if self._scan_cache is not None:
+            return self._scan_cache
+        
+        scan = FailureScan()
+        # Bound once; these run for every failing result
+        failures_append = scan.failures.append
+        by_category = scan.by_category
+        dimension_issues = scan.dimension_issues
+        issue_keywords = scan.issue_keywords
+        
+        for result in self.iter_results():
+            # Failures outlive the streamed records; share their repeated labels
+            category = intern(result.get('category', 'unknown'))
+            eval_data = result.get('evaluation') or _EMPTY
             if 'error' in eval_data:
-                failures.append({
+                failure = {
                     'test_case_id': result['test_case_id'],
                     'question': result['question'],
-                    'category': result.get('category', 'unknown'),
+                    'category': category,
                     'reason': 'evaluation_error',
                     'error': eval_data['error']
-                })
+                }
+                failures_append(failure)
+                by_category[category].append(failure)
                 continue
             
-            overall = eval_data.get('overall_assessment', {})
-            if not overall.get('pass', False) or overall.get('percentage', 100) < 80:
-                failures.append({
-                    'test_case_id': result['test_case_id'],
-                    'question': result['question'],
-                    'category': result.get('category', 'unknown'),
-                    'score': overall.get('percentage', 0),
-                    'verdict': eval_data.get('recommended_action', 'UNKNOWN'),
-                    'issues': self._extract_all_issues(eval_data),
-                    'response': result['response']
-                })
-        
-        return failures
+            # Count weak dimensions and gather their issues in the same walk;
+            # the issues are only kept if the result turns out to fail
+            issues = []
+            for dim in _DIMENSIONS:
+                dim_data = eval_data.get(dim)
+                if dim_data is not None:
+                    if dim_data.get('score', 10) < 8:
+                        dimension_issues[dim] += 1
+                    issues.extend(dim_data.get('issues') or _NO_ISSUES)
+            
+            overall = eval_data.get('overall_assessment') or _EMPTY
+            percentage = overall.get('percentage')
+            # Results the judge failed are settled by the flag alone; the
+            # score only matters for ones it passed
+            if overall.get('pass', False) and (percentage is None or percentage >= 80):
+                continue
+            
+            failure = {
+                'test_case_id': result['test_case_id'],
+                'question': result['question'],
+                'category': category,
+                'score': percentage if percentage is not None else 0,
+                'verdict': intern(eval_data.get('recommended_action', 'UNKNOWN')),
+                'issues': issues,
+                'response': result['response']
+            }
+            failures_append(failure)
+            by_category[category].append(failure)
+            
+            # Extract common issue types; each type counts once per issue
+            for issue in failure['issues']:
+                for issue_type in _classify_issue(issue):
+                    issue_keywords[issue_type] += 1
+        
+        # Stop the defaultdicts growing when callers probe missing keys, so
+        # they can be handed out as they are instead of copied into dicts
+        for counts in (scan.by_category, scan.dimension_issues, scan.issue_keywords):
+            counts.default_factory = None
+        
+        self._scan_cache = scan
+        return scan
     
-    def _extract_all_issues(self, eval_data: Dict) -> List[str]:
-        """Extract all issues from evaluation"""
-        all_issues = []
-        
-        dimensions = ['medical_accuracy', 'safety', 'patient_friendliness', 
-                     'actionability', 'scope_appropriateness']
-        
-        for dim in dimensions:
-            if dim in eval_data:
-                issues = eval_data[dim].get('issues', [])
-                all_issues.extend(issues)
-        
-        return all_issues
+    def find_failures(self) -> List[Dict]:
+        """Get all failed test cases"""
+        return self._scan().failures
     
     def analyze_failure_patterns(self) -> Dict:
         """Identify common patterns in failures"""
-        failures = self.find_failures()
-        
-        # Group by category
-        by_category = defaultdict(list)
-        for f in failures:
-            by_category[f['category']].append(f)
-        
-        # Group by dimension issues
-        dimension_issues = defaultdict(int)
-        for result in self.detailed_results:
-            eval_data = result.get('evaluation', {})
-            if 'error' not in eval_data:
-                for dim in ['medical_accuracy', 'safety', 'patient_friendliness', 
-                           'actionability', 'scope_appropriateness']:
-                    if dim in eval_data:
-                        score = eval_data[dim].get('score', 10)
-                        if score < 8:
-                            dimension_issues[dim] += 1
-        
-        # Extract common issue types
-        issue_keywords = defaultdict(int)
-        for f in failures:
-            for issue in f.get('issues', []):
-                # Extract key phrases
-                issue_lower = issue.lower()
-                if 'red flag' in issue_lower or 'warning' in issue_lower:
-                    issue_keywords['missing_red_flag_warning'] += 1
-                if 'diagnos' in issue_lower:
-                    issue_keywords['inappropriate_diagnosis'] += 1
-                if 'prescrib' in issue_lower or 'medication' in issue_lower:
-                    issue_keywords['inappropriate_prescription'] += 1
-                if 'empathy' in issue_lower or 'tone' in issue_lower:
-                    issue_keywords['poor_empathy'] += 1
-                if 'specific' in issue_lower or 'vague' in issue_lower:
-                    issue_keywords['too_vague'] += 1
-                if 'inaccura' in issue_lower or 'incorrect' in issue_lower:
-                    issue_keywords['medical_inaccuracy'] += 1
+        scan = self._scan()
         
         return {
-            'total_failures': len(failures),
-            'by_category': dict(by_category),
-            'weak_dimensions': dimension_issues,
-            'common_issues': dict(issue_keywords)
+            'total_failures': len(scan.failures),
+            'by_category': scan.by_category,
+            'weak_dimensions': scan.dimension_issues,
+            'common_issues': scan.issue_keywords
         }
     
     def generate_recommendations(self) -> List[str]:
@@ -277,17 +423,22 @@ def create_red_flag_warning(red_flags: List[str]) -> str:
         print(f"DETAILED FAILURE ANALYSIS ({len(failures)} cases)")
         print(f"{'='*80}")
         
+        lines = []
         for i, failure in enumerate(failures, 1):
-            print(f"\n{i}. [{failure['category']}] Score: {failure.get('score', 0):.1f}%")
-            print(f"   Question: {failure['question'][:100]}...")
-            print(f"   Verdict: {failure.get('verdict', 'UNKNOWN')}")
+            lines.append(
+                f"\n{i}. [{failure['category']}] Score: {failure.get('score', 0):.1f}%\n"
+                f"   Question: {failure['question'][:100]}...\n"
+                f"   Verdict: {failure.get('verdict', 'UNKNOWN')}"
+            )
             
             if failure.get('issues'):
-                print(f"   Issues:")
+                lines.append("   Issues:")
                 for issue in failure['issues'][:3]:  # Show first 3 issues
-                    print(f"     • {issue}")
+                    lines.append(f"     • {issue}")
             
-            print(f"   Response preview: {failure.get('response', '')[:150]}...")
+            lines.append(f"   Response preview: {failure.get('response', '')[:150]}...")
+        
+        sys.stdout.write('\n'.join(lines) + '\n')
     
     def print_recommendations(self):
         """Print actionable recommendations"""
@@ -302,8 +453,7 @@ def create_red_flag_warning(red_flags: List[str]) -> str:
         print(f"{'='*80}")
         
         # Sort by priority
-        priority_order = {'CRITICAL': 0, 'HIGH': 1, 'MEDIUM': 2, 'LOW': 3}
-        recommendations.sort(key=lambda x: priority_order.get(x['priority'], 3))
+        recommendations.sort(key=lambda rec: PRIORITY_RANK.get(rec['priority'], 3))
         
         for i, rec in enumerate(recommendations, 1):
             print(f"\n{i}. [{rec['priority']}] {rec['dimension']}")
@@ -328,7 +478,7 @@ def create_red_flag_warning(red_flags: List[str]) -> str:
         failures = self.find_failures()
         
         plan = {
-            'generated_at': self.data.get('evaluated_at'),
+            'generated_at': self.evaluated_at,
             'overall_performance': {
                 'average_score': self.summary['average_score'],
                 'pass_rate': self.summary['pass_rate'],
@@ -347,8 +497,8 @@ def create_red_flag_warning(red_flags: List[str]) -> str:
             'recommendations': recommendations
         }
         
-        with open(filename, 'w') as f:
-            json.dump(plan, f, indent=2)
+        with open(filename, 'wb') as f:
+            f.write(_dumps(plan))
         
         print(f"\n✓ Improvement plan exported to {filename}")
 
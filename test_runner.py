@@ -3,10 +3,14 @@ Automated Test Runner for Medical Chatbot
 Generates responses and runs evaluations
 """
 
+import argparse
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import repeat
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List
 from dotenv import load_dotenv
 
 # Import your chatbot
@@ -15,6 +19,38 @@ from testing_framework import LLMJudgeEvaluator, HumanEvaluationInterface
 
 load_dotenv()
 
+try:
+    import orjson
+
+    def _dumps_line(data) -> bytes:
+        return orjson.dumps(data) + b'\n'
+
+    def _dumps_pretty(data) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps_line(data) -> bytes:
+        return (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+
+    def _dumps_pretty(data) -> bytes:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+    _loads = json.loads
+
+# Test cases answered concurrently by generate_responses
+GENERATION_WORKERS = 8
+
+# Judge calls kept in flight at once by the LLM-as-judge phase
+JUDGE_CONCURRENCY = 10
+
+# The run_full_evaluation settings behind each menu option / --preset
+PRESETS = {
+    '1': dict(use_curated=True, use_forums=False, run_llm_judge=True, run_human_eval=False),
+    '2': dict(use_curated=True, use_forums=True, run_llm_judge=True, run_human_eval=False),
+    '3': dict(use_curated=True, use_forums=False, run_llm_judge=True, run_human_eval=True),
+}
+
 # ============================================================================
 # TEST CASE GENERATOR
 # ============================================================================
@@ -160,18 +196,35 @@ class TestCaseGenerator:
         ]
     
     @staticmethod
-    def load_forum_cases(filepath: str = "test_data/forum_test_cases.json") -> List[Dict]:
-        """Load test cases scraped from web forums"""
-        if not Path(filepath).exists():
+    def load_forum_cases(filepath: str = "test_data/forum_test_cases.jsonl") -> List[Dict]:
+        """
+        Load test cases scraped from web forums; if the file is missing, a
+        .zst copy of it or a pre-JSONL .json file of the same name is read
+        """
+        path = Path(filepath)
+        candidates = (path, path.with_name(path.name + '.zst'), path.with_suffix('.json'))
+        path = next((candidate for candidate in candidates if candidate.exists()), None)
+        if path is None:
             print(f"No forum cases found at {filepath}")
             return []
         
-        with open(filepath, 'r') as f:
-            data = json.load(f)
+        if path.suffix == '.zst':
+            import zstandard
+            f = zstandard.open(path, 'rb')
+        else:
+            f = open(path, 'rb')
+        
+        # One question per line; files from before the JSONL format hold
+        # them in a single document
+        with f:
+            if path.suffix == '.json':
+                questions = _loads(f.read())['questions']
+            else:
+                questions = [_loads(line) for line in f.read().splitlines() if line.strip()]
         
         # Convert forum questions to test case format
         test_cases = []
-        for q in data['questions']:
+        for q in questions:
             test_cases.append({
                 'id': q['id'],
                 'category': q['category'],
@@ -198,46 +251,62 @@ class MedicalChatbotTestRunner:
         self.vectorstore = load_vectorstore(vectorstore_path)
         self.test_patient_id = "test_patient_evaluation"
     
-    def generate_responses(self, test_cases: List[Dict]) -> List[Dict]:
+    def _generate_one(self, test_case: Dict, generated_at: str) -> Dict:
         """
-        Generate chatbot responses for all test cases
+        Answer a single test case with its own chatbot, so no case sees
+        another's conversation and workers never share memory state
         """
-        print(f"\nGenerating responses for {len(test_cases)} test cases...")
-        
-        results = []
+        chatbot = None
+        try:
+            chatbot = PatientChatbot(self.vectorstore, self.test_patient_id)
+            response = chatbot.chat(test_case['question'])
+        except Exception as e:
+            print(f"  ✗ [{test_case['id']}] Error: {e}")
+            return {
+                'test_case': test_case,
+                'response': None,
+                'error': str(e)
+            }
+        finally:
+            if chatbot is not None:
+                chatbot.memory.clear_current_conversation()
         
-        # Create a fresh chatbot instance for testing
-        chatbot = PatientChatbot(self.vectorstore, self.test_patient_id)
+        print(f"  ✓ [{test_case['id']}] Response generated ({len(response)} chars)")
+        return {
+            'test_case': test_case,
+            'response': response,
+            'generated_at': generated_at
+        }
+    
+    def iter_responses(self, test_cases: List[Dict],
+                       max_workers: int = GENERATION_WORKERS) -> Iterator[Dict]:
+        """
+        Yield chatbot responses in test case order as they become available
+        """
+        print(f"\nGenerating responses for {len(test_cases)} test cases...")
         
-        for i, test_case in enumerate(test_cases, 1):
-            print(f"\n[{i}/{len(test_cases)}] Generating response...")
-            
-            try:
-                response = chatbot.chat(test_case['question'])
-                
-                results.append({
-                    'test_case': test_case,
-                    'response': response,
-                    'generated_at': str(Path.cwd())
-                })
-                
-                print(f"  ✓ Response generated ({len(response)} chars)")
-                
-            except Exception as e:
-                print(f"  ✗ Error: {e}")
-                results.append({
-                    'test_case': test_case,
-                    'response': None,
-                    'error': str(e)
-                })
+        # Every response in a run shares one timestamp
+        generated_at = datetime.now().isoformat()
         
-        return results
+        # Each call waits on the vector search and the LLM API, so running a
+        # few at once cuts wall time; map keeps results in test case order
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            yield from pool.map(self._generate_one, test_cases, repeat(generated_at))
+    
+    def generate_responses(self, test_cases: List[Dict],
+                           max_workers: int = GENERATION_WORKERS) -> List[Dict]:
+        """
+        Generate chatbot responses for all test cases
+        """
+        return list(self.iter_responses(test_cases, max_workers))
     
     def run_full_evaluation(self, 
                            use_curated: bool = True,
                            use_forums: bool = False,
                            run_llm_judge: bool = True,
-                           run_human_eval: bool = False):
+                           run_human_eval: bool = False,
+                           generation_workers: int = GENERATION_WORKERS,
+                           judge_concurrency: int = JUDGE_CONCURRENCY):
         """
         Run complete evaluation pipeline
         """
@@ -271,10 +340,8 @@ class MedicalChatbotTestRunner:
         print("PHASE 1: GENERATING RESPONSES")
         print("="*80)
         
-        response_results = self.generate_responses(test_cases)
-        
-        # Save responses
-        self._save_responses(response_results)
+        # Responses are written out as they arrive
+        response_results = self._save_responses(self.iter_responses(test_cases, generation_workers))
         
         # 3. LLM-as-judge evaluation
         if run_llm_judge:
@@ -282,7 +349,7 @@ class MedicalChatbotTestRunner:
             print("PHASE 2: LLM-AS-JUDGE EVALUATION")
             print("="*80)
             
-            evaluator = LLMJudgeEvaluator()
+            evaluator = LLMJudgeEvaluator(max_concurrency=judge_concurrency)
             
             # Filter out failed responses
             valid_results = [r for r in response_results if r['response'] is not None]
@@ -316,29 +383,73 @@ class MedicalChatbotTestRunner:
         print("="*80)
         print("\nResults saved to ./test_results/")
     
-    def _save_responses(self, results: List[Dict], filename: str = "generated_responses.json"):
-        """Save generated responses"""
+    def _save_responses(self, results: Iterable[Dict],
+                        filename: str = "generated_responses.jsonl") -> List[Dict]:
+        """
+        Save generated responses as JSON Lines, one result per line, plus a
+        small *_meta.json with the totals. Returns the results written.
+        """
         output_dir = Path("test_results")
         output_dir.mkdir(exist_ok=True)
         
         filepath = output_dir / filename
+        saved = []
+        successful = 0
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump({
-                'total_cases': len(results),
-                'successful': sum(1 for r in results if r['response'] is not None),
-                'failed': sum(1 for r in results if r['response'] is None),
-                'results': results
-            }, f, indent=2, ensure_ascii=False)
+        # Each line is written as soon as its result is ready, so a crashed
+        # run keeps everything generated so far
+        with open(filepath, 'wb') as f:
+            for result in results:
+                f.write(_dumps_line(result))
+                saved.append(result)
+                if result['response'] is not None:
+                    successful += 1
+        
+        meta_path = output_dir / f"{filepath.stem}_meta.json"
+        with open(meta_path, 'wb') as f:
+            f.write(_dumps_pretty({
+                'total_cases': len(saved),
+                'successful': successful,
+                'failed': len(saved) - successful,
+                'results_file': filepath.name
+            }))
         
         print(f"\n✓ Responses saved to {filepath}")
+        return saved
 
 # ============================================================================
 # MAIN
 # ============================================================================
 
-def main():
+def parse_args(argv=None) -> argparse.Namespace:
+    """Command-line options; with none given, main() asks interactively"""
+    parser = argparse.ArgumentParser(description="Generate chatbot responses and evaluate them")
+    parser.add_argument('--preset', choices=['1', '2', '3', '4'],
+                        help="Run a menu option without the menu (4 asks for a custom configuration)")
+    parser.add_argument('--curated', action=argparse.BooleanOptionalAction, default=None,
+                        help="Use the curated test cases (default: on)")
+    parser.add_argument('--forums', action=argparse.BooleanOptionalAction, default=None,
+                        help="Use the scraped forum test cases (default: off)")
+    parser.add_argument('--llm-judge', action=argparse.BooleanOptionalAction, default=None,
+                        help="Run the LLM-as-judge evaluation (default: on)")
+    parser.add_argument('--human-eval', action=argparse.BooleanOptionalAction, default=None,
+                        help="Run the human evaluation (default: off)")
+    parser.add_argument('--workers', type=int, default=GENERATION_WORKERS,
+                        help=f"Test cases answered at once (default: {GENERATION_WORKERS})")
+    parser.add_argument('--concurrency', type=int, default=JUDGE_CONCURRENCY,
+                        help=f"Judge calls in flight at once (default: {JUDGE_CONCURRENCY})")
+    
+    args = parser.parse_args(argv)
+    args.configured = any(
+        value is not None for value in (args.curated, args.forums, args.llm_judge, args.human_eval)
+    )
+    if args.configured and args.preset:
+        parser.error("--preset cannot be combined with --curated/--forums/--llm-judge/--human-eval")
+    return args
+
+def main(argv=None):
     """Run testing"""
+    args = parse_args(argv)
     
     print("""
     ╔════════════════════════════════════════════════════════════╗
@@ -349,47 +460,43 @@ def main():
     
     runner = MedicalChatbotTestRunner()
     
-    print("\nTest Configuration:")
-    print("1. Full evaluation (curated + LLM judge)")
-    print("2. Full evaluation (curated + forums + LLM judge)")
-    print("3. Include human evaluation")
-    print("4. Custom configuration")
-    
-    choice = input("\nSelect option (1-4): ").strip()
+    if args.configured:
+        choice = None
+    elif args.preset:
+        choice = args.preset
+    else:
+        print("\nTest Configuration:")
+        print("1. Full evaluation (curated + LLM judge)")
+        print("2. Full evaluation (curated + forums + LLM judge)")
+        print("3. Include human evaluation")
+        print("4. Custom configuration")
+        
+        choice = input("\nSelect option (1-4): ").strip()
     
-    if choice == '1':
-        runner.run_full_evaluation(
-            use_curated=True,
-            use_forums=False,
-            run_llm_judge=True,
-            run_human_eval=False
-        )
-    elif choice == '2':
-        runner.run_full_evaluation(
-            use_curated=True,
-            use_forums=True,
-            run_llm_judge=True,
-            run_human_eval=False
-        )
-    elif choice == '3':
-        runner.run_full_evaluation(
-            use_curated=True,
-            use_forums=False,
-            run_llm_judge=True,
-            run_human_eval=True
+    if choice is None:
+        config = dict(
+            use_curated=args.curated is not False,
+            use_forums=bool(args.forums),
+            run_llm_judge=args.llm_judge is not False,
+            run_human_eval=bool(args.human_eval)
         )
+    elif choice in PRESETS:
+        config = PRESETS[choice]
     elif choice == '4':
-        use_curated = input("Use curated cases? (y/n): ").lower() == 'y'
-        use_forums = input("Use web forum cases? (y/n): ").lower() == 'y'
-        run_llm = input("Run LLM judge? (y/n): ").lower() == 'y'
-        run_human = input("Run human eval? (y/n): ").lower() == 'y'
-        
-        runner.run_full_evaluation(
-            use_curated=use_curated,
-            use_forums=use_forums,
-            run_llm_judge=run_llm,
-            run_human_eval=run_human
+        config = dict(
+            use_curated=input("Use curated cases? (y/n): ").lower() == 'y',
+            use_forums=input("Use web forum cases? (y/n): ").lower() == 'y',
+            run_llm_judge=input("Run LLM judge? (y/n): ").lower() == 'y',
+            run_human_eval=input("Run human eval? (y/n): ").lower() == 'y'
         )
+    else:
+        return
+    
+    runner.run_full_evaluation(
+        **config,
+        generation_workers=args.workers,
+        judge_concurrency=args.concurrency
+    )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()